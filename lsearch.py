@@ -1,30 +1,36 @@
 #!/usr/bin/env python3
 import re
+import ssl
+import socket
 import html as htmllib
 import asyncio
 import argparse
+import os
+import multiprocessing
+import sys
 import time
 import random
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse, parse_qs, urlencode
 from pathlib import Path
 import webbrowser
 
 import aiohttp
+import orjson
 from aiohttp import ClientSession, ClientTimeout
+from selectolax.lexbor import LexborHTMLParser
 
-try:
+if sys.platform != "win32":
     import uvloop
-    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-except Exception:
-    pass
+    _runner = uvloop.run
+else:
+    _runner = asyncio.run
 
 try:
-    from tqdm.asyncio import tqdm_asyncio
     from tqdm import tqdm
 except Exception:
     tqdm = None
-    tqdm_asyncio = None
 
 BASE = "https://play.limitlesstcg.com"
 LIST_URL = (f"{BASE}/tournaments/completed"
@@ -33,24 +39,23 @@ LIST_URL = (f"{BASE}/tournaments/completed"
 RPS = 360
 CONCURRENCY_PAGES = 12
 CONCURRENCY_DECKS = 180
-FAIL_ON = 1
+MIN_WIN_RATE = 0.40
+MAX_INFLIGHT = 2 * CONCURRENCY_PAGES + CONCURRENCY_DECKS
 JITTER_MAX_S = 0.005
 TIMEOUT = 18
+KEEPALIVE_S = 75
+STREAM_CHUNK = 16384
+TCP_KEEPIDLE_S = 30
 UA = "Mozilla/5.0 (LimitlessScraper/fixed-locked/4.6)"
 
-RE_INPUT_VALUE = re.compile(r'<input[^>]*\bname=["\']input["\'][^>]*\bvalue=["\'](.*?)["\']', re.I | re.S)
-NAME_FIELD_RE = re.compile(r'"name":"([^"]+)"', re.I)
+RE_INPUT_VALUE = re.compile(r'<input[^>]*\bname=["\']input["\'][^>]*\bvalue=(["\'])(.*?)\1', re.S)
 RE_JS_DECKBLOCK = re.compile(r"const\s+decklist\s*=\s*`(.*?)`", re.S)
-RE_DECKLIST_BLOCK = re.compile(r'<div[^>]*class="decklist"[^>]*>(.*?)</div>\s*</div>\s*</div>', re.I | re.S)
-RE_ANCHOR_TEXT = re.compile(r"<a\b[^>]*>(.*?)</a>", re.I | re.S)
 RE_DATA_MAX = re.compile(r'<ul[^>]*class="pagination"[^>]*data-max="(\d+)"', re.I)
-RE_TOURNEY_STANDINGS = re.compile(r'href="(/tournament/[^"/]+/standings)"', re.I)
-RE_DECKLIST = re.compile(r'href="(/tournament/[^"/]+/player/[^"/]+/decklist)"', re.I)
-RE_ARCHETYPE = re.compile(r'<div[^>]*class=["\']deck["\'][^>]*\bdata-tooltip=["\']([^"\']+)["\']', re.I)
-RE_DETAILS = re.compile(
-    r'<div[^>]*class=["\']details["\'][^>]*>\s*(\d+)\s+points\s*\((\d+)-(\d+)-(\d+)\)\s*(?:<i>\s*drop\s*</i>)?\s*</div>',
-    re.I
-)
+RE_PTS = re.compile(r'(\d+)\s*points')
+RE_REC = re.compile(r'\((\d+)-(\d+)-(\d+)\)')
+RE_STANDINGS_RECORD = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*-\s*(\d+)\s*')
+RE_PLAYER_SLUG = re.compile(r"/player/([^/]+)/decklist")
+RE_UNSAFE_FILENAME = re.compile(r"[^a-z0-9._-]+")
 
 def _set_q(url: str, key: str, value: str) -> str:
     u = urlparse(url)
@@ -60,248 +65,348 @@ def _set_q(url: str, key: str, value: str) -> str:
 
 def _safe_filename(name: str) -> str:
     s = name.strip().lower()
-    s = re.sub(r"[^a-z0-9._-]+", "_", s)
+    s = RE_UNSAFE_FILENAME.sub("_", s)
     return s or "results"
 
-def _dedupe_keep_order(urls: List[str]) -> List[str]:
-    seen, out = set(), []
-    for u in urls:
-        if u not in seen:
-            seen.add(u); out.append(u)
-    return out
-
 class FixedPacer:
     def __init__(self, rps: int):
-        from collections import deque
-        self.rps = max(1, int(rps))
-        self.starts = deque()
-        self.lock = asyncio.Lock()
+        self.rps = float(max(1, int(rps)))
+        self.tokens = self.rps
+        self.last = time.monotonic()
         self.total_started = 0
     async def acquire(self):
-        while True:
-            async with self.lock:
-                now = time.monotonic()
-                while self.starts and (now - self.starts[0] >= 1.0):
-                    self.starts.popleft()
-                if len(self.starts) < self.rps:
-                    self.starts.append(now)
-                    self.total_started += 1
-                    if JITTER_MAX_S > 0:
-                        j = (random.random() * 2 - 1) * JITTER_MAX_S
-                        if j > 0:
-                            await asyncio.sleep(j)
-                    return
-                sleep_for = 1.0 - (now - self.starts[0])
-            await asyncio.sleep(max(0.001, sleep_for))
-
-async def _get(session: ClientSession, pacer: FixedPacer, url: str, stop_evt: asyncio.Event) -> str:
-    if stop_evt.is_set():
-        raise asyncio.CancelledError
+        # Reserve a token up front; a negative balance is the queue of callers
+        # ahead of us, so each caller sleeps exactly once for its own slot.
+        now = time.monotonic()
+        self.tokens = min(self.rps, self.tokens + (now - self.last) * self.rps)
+        self.last = now
+        self.tokens -= 1.0
+        self.total_started += 1
+        if self.tokens < 0:
+            sleep_for = -self.tokens / self.rps
+            if JITTER_MAX_S > 0:
+                sleep_for += random.random() * JITTER_MAX_S
+            await asyncio.sleep(sleep_for)
+
+def _socket_factory(addr_info) -> socket.socket:
+    family, type_, proto, _, _ = addr_info
+    sock = socket.socket(family=family, type=type_, proto=proto)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPIDLE_S)
+    return sock
+
+class FetchError(Exception):
+    """An HTTP fetch failed; already reported by _fail_fast."""
+
+def _fail_fast(url: str, e: Exception):
+    print(f"[fail-fast] error on {url}")
+    if isinstance(e, aiohttp.ClientResponseError):
+        print(f"[fail-fast] HTTP {e.status}: {e.message}")
+    else:
+        print(f"[fail-fast] {type(e).__name__}: {e}")
+
+async def _get(session: ClientSession, pacer: FixedPacer, url: str) -> str:
     await pacer.acquire()
     try:
         async with session.get(url, timeout=ClientTimeout(total=TIMEOUT)) as r:
             r.raise_for_status()
             return await r.text()
     except Exception as e:
-        if not stop_evt.is_set():
-            print(f"[fail-fast] error on {url}")
-            if isinstance(e, aiohttp.ClientResponseError):
-                print(f"[fail-fast] HTTP {e.status}: {e.message}")
-            else:
-                print(f"[fail-fast] {type(e).__name__}: {e}")
-            stop_evt.set()
-        raise
+        _fail_fast(url, e)
+        raise FetchError(url) from e
+
+async def _get_stream(session: ClientSession, pacer: FixedPacer, url: str,
+                      needle_b: Optional[bytes]) -> Optional[bytes]:
+    await pacer.acquire()
+    try:
+        async with session.get(url, timeout=ClientTimeout(total=TIMEOUT)) as r:
+            r.raise_for_status()
+            if needle_b is None:
+                return await r.read()
+            # Screen each chunk as it arrives, carrying len(needle)-1 bytes over so a
+            # match straddling a boundary is still seen; a page that never matches is
+            # only ever held once, as its raw chunks, and is dropped without a join.
+            chunks: List[bytes] = []
+            found = False
+            keep = len(needle_b) - 1
+            carry = b""
+            async for chunk in r.content.iter_chunked(STREAM_CHUNK):
+                chunks.append(chunk)
+                if not found:
+                    window = carry + chunk.lower()
+                    found = needle_b in window
+                    carry = window[-keep:] if keep > 0 else b""
+            return b"".join(chunks) if found else None
+    except Exception as e:
+        _fail_fast(url, e)
+        raise FetchError(url) from e
 
 def _max_page(html: str) -> int:
     m = RE_DATA_MAX.search(html)
     return int(m.group(1)) if m else 1
 
 def _extract_standings(html: str) -> List[str]:
-    seen, out = set(), []
-    for m in RE_TOURNEY_STANDINGS.finditer(html):
-        url = BASE + m.group(1)
-        if url not in seen:
-            seen.add(url); out.append(url)
-    return out
-
-def _extract_decks(html: str) -> List[str]:
-    seen, out = set(), []
-    for m in RE_DECKLIST.finditer(html):
-        url = BASE + m.group(1)
-        if url not in seen:
-            seen.add(url); out.append(url)
+    return [BASE + a.attrs["href"]
+            for a in LexborHTMLParser(html).css('a[href^="/tournament/"][href$="/standings"]')]
+
+def _extract_decks(html: str) -> List[Tuple[str, Optional[Tuple[int, int, int]]]]:
+    out = []
+    for a in LexborHTMLParser(html).css('a[href^="/tournament/"][href*="/player/"][href$="/decklist"]'):
+        row = a.parent
+        while row is not None and row.tag != "tr":
+            row = row.parent
+        out.append((BASE + a.attrs["href"], _row_record(row) if row is not None else None))
     return out
 
-def _has_card_from_hidden_json(html: str, needle: str) -> bool:
-    m = RE_INPUT_VALUE.search(html)
+def _row_record(row) -> Optional[Tuple[int, int, int]]:
+    # The record must be a cell of its own; exactly one such cell is required so
+    # a name like "Joe 2-2-2" or a second W-L-T-shaped column never gets picked.
+    found = [m for m in (RE_STANDINGS_RECORD.fullmatch(td.text()) for td in row.css("td")) if m]
+    if len(found) != 1:
+        return None
+    m = found[0]
+    return (int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+def _below_cutoff(record: Optional[Tuple[int, int, int]]) -> bool:
+    if record is None:
+        return False
+    wins, losses, _ = record
+    return wins / max(1, wins + losses) < MIN_WIN_RATE
+
+def _needle_is_literal(needle: str) -> bool:
+    # Only plain ASCII needles are guaranteed to appear verbatim in the raw page;
+    # anything else may be entity- or JSON-escaped in the markup.
+    return needle.isascii() and not any(c in needle for c in "&<>\"'\\")
+
+def _iter_card_names(obj):
+    if isinstance(obj, dict):
+        name = obj.get("name")
+        if isinstance(name, str):
+            yield name
+        for v in obj.values():
+            if isinstance(v, (dict, list)):
+                yield from _iter_card_names(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _iter_card_names(v)
+
+def _has_card_from_hidden_json(hay: str, needle: str) -> bool:
+    m = RE_INPUT_VALUE.search(hay)
     if not m:
         return False
-    raw = htmllib.unescape(m.group(1))
-    for name in NAME_FIELD_RE.findall(raw):
-        if needle in name.lower():
+    # Only the quote entity has to be decoded for the blob to parse; other
+    # entities can only occur inside names and matter just for escaped needles.
+    try:
+        data = orjson.loads(m.group(2).replace("&quot;", '"').replace("&#34;", '"'))
+    except orjson.JSONDecodeError:
+        return False
+    literal = _needle_is_literal(needle)
+    for name in _iter_card_names(data):
+        if needle in (name if literal else htmllib.unescape(name)):
             return True
     return False
 
-def _has_card_from_js_block(html: str, needle: str) -> bool:
-    m = RE_JS_DECKBLOCK.search(html)
+def _has_card_from_js_block(hay: str, needle: str) -> bool:
+    m = RE_JS_DECKBLOCK.search(hay)
     if not m:
         return False
-    return needle in m.group(1).lower()
+    return needle in m.group(1)
 
-def _has_card_from_anchor_texts(html: str, needle: str) -> bool:
-    m = RE_DECKLIST_BLOCK.search(html)
-    block = m.group(1) if m else html
-    for txt in RE_ANCHOR_TEXT.findall(block):
-        if needle in htmllib.unescape(txt).lower():
-            return True
-    plain = re.sub(r"<[^>]+>", " ", block)
-    return needle in htmllib.unescape(plain).lower()
+def _has_card_from_decklist_text(tree: LexborHTMLParser, needle: str) -> bool:
+    block = tree.css_first("div.decklist") or tree.body
+    if block is None:
+        return False
+    return needle in block.text(separator=" ").lower()
 
-def _deck_has_card(html: str, card_lower: str) -> bool:
-    if _has_card_from_hidden_json(html, card_lower):
+def _deck_has_card(hay: str, tree: LexborHTMLParser, card_lower: str) -> bool:
+    if _has_card_from_hidden_json(hay, card_lower):
         return True
-    if _has_card_from_js_block(html, card_lower):
+    if _has_card_from_js_block(hay, card_lower):
         return True
-    if _has_card_from_anchor_texts(html, card_lower):
+    if _has_card_from_decklist_text(tree, card_lower):
         return True
     return False
 
-def _extract_archetype(html: str) -> str:
-    m = RE_ARCHETYPE.search(html)
-    return m.group(1).strip() if m else "Other"
-
-def _extract_details(html: str) -> Tuple[int, int, int, int, bool]:
-    m = RE_DETAILS.search(html)
-    if m:
-        points = int(m.group(1)); wins = int(m.group(2)); losses = int(m.group(3)); ties = int(m.group(4))
-        dropped = ("drop" in m.group(0).lower())
-        return (points, wins, losses, ties, dropped)
-    details_div = re.search(r'<div[^>]*class=["\']details["\'][^>]*>(.*?)</div>', html, re.I | re.S)
-    if details_div:
-        text = htmllib.unescape(re.sub(r"<[^>]+>", " ", details_div.group(1))).lower()
-        pts = re.search(r'(\d+)\s*points', text)
-        rec = re.search(r'\((\d+)-(\d+)-(\d+)\)', text)
-        dropped = "drop" in text
-        points = int(pts.group(1)) if pts else 0
-        if rec:
-            wins, losses, ties = int(rec.group(1)), int(rec.group(2)), int(rec.group(3))
-        else:
-            wins = losses = ties = 0
-        return (points, wins, losses, ties, dropped)
-    return (0, 0, 0, 0, False)
+def _extract_archetype(tree: LexborHTMLParser) -> str:
+    node = tree.css_first("div.deck[data-tooltip]")
+    if node is None:
+        return "Other"
+    return (node.attrs["data-tooltip"] or "").strip() or "Other"
+
+def _extract_details(tree: LexborHTMLParser) -> Tuple[int, int, int, int, bool]:
+    node = tree.css_first("div.details")
+    if node is None:
+        return (0, 0, 0, 0, False)
+    text = node.text(separator=" ").lower()
+    pts = RE_PTS.search(text)
+    rec = RE_REC.search(text)
+    dropped = "drop" in text
+    points = int(pts.group(1)) if pts else 0
+    if rec:
+        wins, losses, ties = int(rec.group(1)), int(rec.group(2)), int(rec.group(3))
+    else:
+        wins = losses = ties = 0
+    return (points, wins, losses, ties, dropped)
+
+def _parse_deck(raw: bytes, needle: str) -> Optional[Dict]:
+    html = raw.decode("utf-8", errors="replace")
+    hay = html.lower()
+    if _needle_is_literal(needle) and needle not in hay:
+        return None
+    # One DOM parse of the original markup serves the card check and both
+    # extractors; only extracted text is lowercased for the needle check.
+    tree = LexborHTMLParser(html)
+    if not _deck_has_card(hay, tree, needle):
+        return None
+    points, wins, losses, ties, dropped = _extract_details(tree)
+    denom = wins + losses
+    win_rate = (wins / denom) if denom > 0 else 0.0
+    return {
+        "archetype": _extract_archetype(tree),
+        "points": points,
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "dropped": dropped,
+        "win_rate": win_rate,
+        "played": wins + losses + ties,
+    }
 
 def _player_from_url(url: str) -> str:
-    m = re.search(r"/player/([^/]+)/decklist", url)
+    m = RE_PLAYER_SLUG.search(url)
     if not m:
         return ""
     slug = m.group(1)
     name = slug.replace("-", " ").strip()
     return name.title()
 
-async def run(card: str) -> Tuple[int, int, List[Dict]]:
+async def run(card: str) -> Tuple[int, int, List[Dict], bool]:
     headers = {
         "User-Agent": UA,
         "Accept": "text/html,application/xhtml+xml",
         "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
     }
+    ssl_ctx = ssl.create_default_context()
     conn = aiohttp.TCPConnector(
-        limit=CONCURRENCY_PAGES + CONCURRENCY_DECKS,
-        ttl_dns_cache=300,
+        limit=MAX_INFLIGHT,
+        limit_per_host=MAX_INFLIGHT,
+        ttl_dns_cache=600,
+        use_dns_cache=True,
         enable_cleanup_closed=True,
+        keepalive_timeout=KEEPALIVE_S,
+        ssl=ssl_ctx,
+        socket_factory=_socket_factory,
     )
     pacer = FixedPacer(RPS)
-    stop_evt = asyncio.Event()
-    error_count = 0
     matches: List[Dict] = []
 
-    async with aiohttp.ClientSession(headers=headers, connector=conn) as session:
-        first = await _get(session, pacer, LIST_URL, stop_evt)
-        maxp = _max_page(first)
-        pages = [LIST_URL] + [_set_q(LIST_URL, "page", str(p)) for p in range(2, maxp + 1)]
-
-        tourneys: List[str] = []
-        sem_pages = asyncio.Semaphore(CONCURRENCY_PAGES)
-
-        async def fetch_page(url: str):
-            nonlocal error_count
-            if stop_evt.is_set(): return
-            try:
-                async with sem_pages:
-                    html = await _get(session, pacer, url, stop_evt)
-                    tourneys.extend(_extract_standings(html))
-            except Exception:
-                error_count += 1
-                stop_evt.set()
-
-        if tqdm:
-            await tqdm_asyncio.gather(*(fetch_page(u) for u in pages), desc="List pages", unit="page")
-        else:
-            await asyncio.gather(*(fetch_page(u) for u in pages))
-
-        uniq_tourneys = _dedupe_keep_order(tourneys)
-        if stop_evt.is_set():
-            return 0, 0, matches
-
-        deck_urls: List[str] = []
-        sem_pages2 = asyncio.Semaphore(CONCURRENCY_PAGES)
-
-        async def fetch_tourney(url: str):
-            nonlocal error_count
-            if stop_evt.is_set(): return
-            try:
-                async with sem_pages2:
-                    html = await _get(session, pacer, url, stop_evt)
-                    deck_urls.extend(_extract_decks(html))
-            except Exception:
-                error_count += 1
-                stop_evt.set()
-
-        if tqdm:
-            await tqdm_asyncio.gather(*(fetch_tourney(u) for u in uniq_tourneys), desc="Tournaments", unit="t")
-        else:
-            await asyncio.gather(*(fetch_tourney(u) for u in uniq_tourneys))
-
-        uniq_decks = _dedupe_keep_order(deck_urls)
-        if stop_evt.is_set():
-            return len(uniq_tourneys), len(uniq_decks), matches
-
-        needle = card.strip().lower()
-        sem_decks = asyncio.Semaphore(CONCURRENCY_DECKS)
-
-        async def check_deck(url: str):
-            nonlocal error_count
-            if stop_evt.is_set(): return
+    loop = asyncio.get_running_loop()
+
+    # Workers start lazily, once the loop, tqdm and resolver threads are running,
+    # so never fork this process directly; forkserver/spawn start from a clean one.
+    mp_ctx = multiprocessing.get_context("spawn" if sys.platform == "win32" else "forkserver")
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_ctx) as pool:
+        async with aiohttp.ClientSession(headers=headers, connector=conn) as session:
+            first = await _get(session, pacer, LIST_URL)
+            maxp = _max_page(first)
+
+            page_q: asyncio.Queue = asyncio.Queue()
+            tourney_q: asyncio.Queue = asyncio.Queue()
+            deck_q: asyncio.Queue = asyncio.Queue()
+            tourneys_seen: set = set()
+            decks_seen: set = set()
+            needle = card.strip().lower()
+            # Literal needles can be screened on the raw bytes without decoding
+            # or shipping non-matching pages to the process pool.
+            needle_b = needle.encode() if _needle_is_literal(needle) else None
+
+            bar_pages = tqdm(total=maxp, desc="List pages", unit="page") if tqdm else None
+            bar_tourneys = tqdm(total=0, desc="Tournaments", unit="t") if tqdm else None
+            bar_decks = tqdm(total=0, desc="Decks", unit="deck") if tqdm else None
+
+            def push_tourneys(html: str):
+                for u in _extract_standings(html):
+                    if u not in tourneys_seen:
+                        tourneys_seen.add(u)
+                        tourney_q.put_nowait(u)
+                        if bar_tourneys is not None:
+                            bar_tourneys.total += 1
+
+            def push_decks(html: str):
+                for u, record in _extract_decks(html):
+                    # Standings already carry each player's record, so decks that the
+                    # report would filter out anyway are never fetched.
+                    if _below_cutoff(record):
+                        continue
+                    if u not in decks_seen:
+                        decks_seen.add(u)
+                        deck_q.put_nowait(u)
+                        if bar_decks is not None:
+                            bar_decks.total += 1
+
+            async def fetch_page(url: str):
+                push_tourneys(await _get(session, pacer, url))
+
+            async def fetch_tourney(url: str):
+                push_decks(await _get(session, pacer, url))
+
+            async def check_deck(url: str):
+                raw = await _get_stream(session, pacer, url, needle_b)
+                if raw is None:
+                    return
+                found = await loop.run_in_executor(pool, _parse_deck, raw, needle)
+                if found is not None:
+                    # Results come back unpickled, so intern here rather than in the
+                    # worker process for archetype strings to be shared across decks.
+                    found["archetype"] = sys.intern(found["archetype"])
+                    found["url"] = url
+                    found["player"] = _player_from_url(url)
+                    matches.append(found)
+
+            async def worker(q: asyncio.Queue, handle, bar):
+                while True:
+                    url = await q.get()
+                    await handle(url)
+                    if bar is not None:
+                        bar.update(1)
+                    q.task_done()
+
+            push_tourneys(first)
+            if bar_pages is not None:
+                bar_pages.update(1)
+            for p in range(2, maxp + 1):
+                page_q.put_nowait(_set_q(LIST_URL, "page", str(p)))
+
+            partial = False
             try:
-                async with sem_decks:
-                    html = await _get(session, pacer, url, stop_evt)
-                    if _deck_has_card(html, needle):
-                        points, wins, losses, ties, dropped = _extract_details(html)
-                        denom = wins + losses
-                        win_rate = (wins / denom) if denom > 0 else 0.0
-                        matches.append({
-                            "url": url,
-                            "player": _player_from_url(url),
-                            "archetype": _extract_archetype(html),
-                            "points": points,
-                            "wins": wins,
-                            "losses": losses,
-                            "ties": ties,
-                            "dropped": dropped,
-                            "win_rate": win_rate,
-                            "played": wins + losses + ties,
-                        })
-            except Exception:
-                error_count += 1
-                if error_count >= FAIL_ON:
-                    stop_evt.set()
-
-        if tqdm:
-            await tqdm_asyncio.gather(*(check_deck(u) for u in uniq_decks), desc="Decks", unit="deck")
-        else:
-            await asyncio.gather(*(check_deck(u) for u in uniq_decks))
-
-        return len(uniq_tourneys), len(uniq_decks), matches
+                async with asyncio.TaskGroup() as tg:
+                    workers = (
+                        [tg.create_task(worker(page_q, fetch_page, bar_pages)) for _ in range(CONCURRENCY_PAGES)]
+                        + [tg.create_task(worker(tourney_q, fetch_tourney, bar_tourneys)) for _ in range(CONCURRENCY_PAGES)]
+                        + [tg.create_task(worker(deck_q, check_deck, bar_decks)) for _ in range(CONCURRENCY_DECKS)]
+                    )
+                    # Each stage only feeds the next, so joining upstream first guarantees
+                    # nothing new will be queued downstream once its join returns.
+                    await page_q.join()
+                    await tourney_q.join()
+                    await deck_q.join()
+                    for w in workers:
+                        w.cancel()
+            except* Exception as eg:
+                # The first failure cancels every other worker. Fetch errors were
+                # already printed by _fail_fast; anything else is reported here.
+                partial = True
+                for e in eg.exceptions:
+                    if not isinstance(e, FetchError):
+                        print(f"[fail-fast] {type(e).__name__}: {e}")
+            finally:
+                for bar in (bar_pages, bar_tourneys, bar_decks):
+                    if bar is not None:
+                        bar.close()
+
+            return len(tourneys_seen), len(decks_seen), matches, partial
 
 def _format_elapsed(seconds: float) -> str:
     if seconds < 60:
@@ -310,8 +415,9 @@ def _format_elapsed(seconds: float) -> str:
     secs = int(round(seconds - mins * 60))
     return f"{mins}:{secs:02d}"
 
-def _render_html(card: str, tournaments: int, decks: int, matches: List[Dict], elapsed_s: float) -> str:
-    matches = [m for m in matches if m["win_rate"] >= 0.40]
+def _write_html(path: Path, card: str, tournaments: int, decks: int, matches: List[Dict], elapsed_s: float,
+                partial: bool = False) -> None:
+    matches = [m for m in matches if m["win_rate"] >= MIN_WIN_RATE]
     groups: Dict[str, List[Dict]] = {}
     for m in matches:
         groups.setdefault(m["archetype"], []).append(m)
@@ -321,6 +427,7 @@ def _render_html(card: str, tournaments: int, decks: int, matches: List[Dict], e
     safe = _safe_filename(card)
     total = sum(len(v) for v in groups.values())
     elapsed = _format_elapsed(elapsed_s)
+    partial_note = '\n    <div class="partial">Partial results · scan aborted on error</div>' if partial else ""
 
     head = f"""<!doctype html>
 <html lang="en">
@@ -354,6 +461,7 @@ body {{ margin:0; font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI
 .pct {{ font-variant-numeric: tabular-nums; white-space: nowrap; }}
 .rec {{ font-variant-numeric: tabular-nums; white-space: nowrap; }}
 .drop {{ color:#ff9c9c; font-weight:600; margin-left:6px; }}
+.partial {{ color:#ff9c9c; font-weight:600; }}
 .controls {{ margin-top:10px; display:flex; gap:8px; flex-wrap:wrap; }}
 input[type="search"] {{ background:#0f141b; color:var(--fg); border:1px solid #1f2a36; border-radius:10px; padding:8px 10px; outline:none; }}
 .hide {{ display:none; }}
@@ -366,7 +474,7 @@ input[type="search"] {{ background:#0f141b; color:var(--fg); border:1px solid #1
   <div class="meta">
     <div><strong>{total}</strong> matches · grouped by archetype</div>
     <div>{tournaments} tournaments · {decks} deck pages scanned</div>
-    <div>Elapsed: {elapsed}</div>
+    <div>Elapsed: {elapsed}</div>{partial_note}
   </div>
   <div class="controls">
     <input id="filter" type="search" placeholder="Filter by archetype or player…">
@@ -374,32 +482,6 @@ input[type="search"] {{ background:#0f141b; color:var(--fg); border:1px solid #1
 </div>
 <div class="container">
 """
-    rows = []
-    for arch in sorted(groups.keys()):
-        block = [(
-            f'<div class="group">'
-            f'<div class="group-hd"><div class="group-title">{arch}</div><div class="badge">{len(groups[arch])}</div></div>'
-            f'<table class="table">'
-            f'<colgroup><col class="col-pct"><col class="col-rec"><col class="col-player"><col class="col-link"></colgroup>'
-            f'<thead><tr><th>Win %</th><th>Record</th><th>Player</th><th>Link</th></tr></thead><tbody>'
-        )]
-        for m in groups[arch]:
-            pct = f"{m['win_rate']*100:.2f}%"
-            rec = f"{m['wins']}-{m['losses']}-{m['ties']}"
-            if m.get("dropped"):
-                rec += ' <span class="drop">Drop</span>'
-            player = (m.get("player") or "").strip() or "—"
-            block.append(
-                f"<tr data-arch=\"{arch.lower()}\" data-player=\"{player.lower()}\">"
-                f"<td class=\"pct\">{pct}</td>"
-                f"<td class=\"rec\">{rec}</td>"
-                f"<td>{player}</td>"
-                f"<td><a href=\"{m['url']}\" target=\"_blank\">Open deck</a></td>"
-                f"</tr>"
-            )
-        block.append("</tbody></table></div>")
-        rows.append("\n".join(block))
-
     tail = """
 </div>
 <div class="footer">Generated locally · Use your browser’s “Print → Save as PDF” to export</div>
@@ -419,7 +501,37 @@ q.addEventListener('input', () => {
 </body>
 </html>
 """
-    return head + "\n".join(rows) + tail
+    with path.open("w", encoding="utf-8") as f:
+        f.write(head)
+        for arch in sorted(groups.keys()):
+            # Archetypes come back entity-decoded from selectolax, so escape them
+            # again before they go into markup or an attribute value.
+            arch_html = htmllib.escape(arch, quote=True)
+            arch_lower = htmllib.escape(arch.lower(), quote=True)
+            f.write(
+                f'<div class="group">'
+                f'<div class="group-hd"><div class="group-title">{arch_html}</div><div class="badge">{len(groups[arch])}</div></div>'
+                f'<table class="table">'
+                f'<colgroup><col class="col-pct"><col class="col-rec"><col class="col-player"><col class="col-link"></colgroup>'
+                f'<thead><tr><th>Win %</th><th>Record</th><th>Player</th><th>Link</th></tr></thead><tbody>\n'
+            )
+            for m in groups[arch]:
+                pct = f"{m['win_rate']*100:.2f}%"
+                rec = f"{m['wins']}-{m['losses']}-{m['ties']}"
+                if m.get("dropped"):
+                    rec += ' <span class="drop">Drop</span>'
+                player = (m.get("player") or "").strip() or "—"
+                player_lower = player.lower()
+                f.write(
+                    f"<tr data-arch=\"{arch_lower}\" data-player=\"{player_lower}\">"
+                    f"<td class=\"pct\">{pct}</td>"
+                    f"<td class=\"rec\">{rec}</td>"
+                    f"<td>{player}</td>"
+                    f"<td><a href=\"{m['url']}\" target=\"_blank\">Open deck</a></td>"
+                    f"</tr>\n"
+                )
+            f.write("</tbody></table></div>\n")
+        f.write(tail)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -427,18 +539,19 @@ def main():
     args = ap.parse_args()
 
     t0 = time.time()
-    tournaments, decks, matches = asyncio.run(run(args.card))
+    tournaments, decks, matches, partial = _runner(run(args.card))
     elapsed = time.time() - t0
 
-    html = _render_html(args.card, tournaments, decks, matches, elapsed)
     out_path = Path(f"{_safe_filename(args.card)}.html").resolve()
-    out_path.write_text(html, encoding="utf-8")
+    _write_html(out_path, args.card, tournaments, decks, matches, elapsed, partial)
 
     print(f"Tournaments:   {tournaments}")
     print(f"Decks:         {decks}")
-    print(f"Matches:       {sum(1 for m in matches if m['win_rate'] >= 0.40)}")
+    print(f"Matches:       {sum(1 for m in matches if m['win_rate'] >= MIN_WIN_RATE)}")
     print(f"Elapsed Time:  {_format_elapsed(elapsed)}")
     print(f"Output:        {out_path}")
+    if partial:
+        print("Warning:       scan aborted on error; results are partial")
 
     try:
         webbrowser.open(out_path.as_uri())